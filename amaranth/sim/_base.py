@@ -47,7 +47,7 @@ class BaseSimulation:
 
 
 class BaseEngine:
-    def add_coroutine_process(self, process, *, default_cmd):
+    def add_coroutine_process(self, process, *, default_cmd, first_cmd=None):
         raise NotImplementedError
 
     def add_clock_process(self, clock, *, phase, period):
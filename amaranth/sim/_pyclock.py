@@ -10,6 +10,9 @@ class PyClockProcess(BaseProcess):
 
         self.state  = state
         self.slot   = self.state.get_signal(signal)
+        # The signal-to-slot assignment is stable for the lifetime of the simulation, so the
+        # clock state can be resolved once here rather than on every edge.
+        self.clk_state = self.state.slots[self.slot]
         self.phase  = phase
         self.period = period
 
@@ -29,6 +32,8 @@ class PyClockProcess(BaseProcess):
             self.state.wait_interval(self, self.phase)
 
         else:
-            clk_state = self.state.slots[self.slot]
-            clk_state.set(not clk_state.curr)
+            clk_state = self.clk_state
+            # The clock signal is 1 bit wide, so the toggle is a plain integer xor; this also
+            # keeps bools out of the signal state, which stores ints everywhere else.
+            clk_state.set(clk_state.curr ^ 1)
             self.state.wait_interval(self, self.period // 2)
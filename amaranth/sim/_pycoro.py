@@ -11,11 +11,26 @@ __all__ = ["PyCoroProcess"]
 
 
 class PyCoroProcess(BaseProcess):
-    def __init__(self, state, domains, constructor, *, default_cmd=None):
+    def __init__(self, state, domains, constructor, *, default_cmd=None, first_cmd=None):
         self.state = state
         self.domains = domains
+        # Trigger parameters per domain name: (clk, clk trigger value, async reset or None).
+        # A domain's clock edge and reset style never change during a simulation, so the Tick
+        # handler can look these up instead of redoing the string compare on every clock cycle.
+        self.domain_triggers = {
+            name: (domain.clk,
+                   1 if domain.clk_edge == "pos" else 0,
+                   domain.rst if domain.rst is not None and domain.async_reset else None)
+            for name, domain in domains.items()
+        }
         self.constructor = constructor
         self.default_cmd = default_cmd
+        self.first_cmd = first_cmd
+        # Compiled code for commands, keyed by command identity. Testbenches that repeatedly
+        # yield the same Value or Statement object skip code generation on every yield but
+        # the first. The signal-to-slot assignment never changes, so entries stay valid across
+        # reset() and are deliberately kept there.
+        self.command_cache = {}
 
         self.reset()
 
@@ -24,6 +39,7 @@ class PyCoroProcess(BaseProcess):
         self.passive = False
 
         self.coroutine = self.constructor()
+        self.startup_cmd = self.first_cmd
         self.exec_locals = {
             "slots": self.state.slots,
             "result": None,
@@ -43,6 +59,23 @@ class PyCoroProcess(BaseProcess):
             frame = coroutine.cr_frame
         return "{}:{}".format(inspect.getfile(frame), inspect.getlineno(frame))
 
+    def compile_command(self, command):
+        # The cache holds a reference to each command, which both keeps the id() key unique
+        # and pins the generated code; bound its size so that testbenches constructing a fresh
+        # statement per yield do not accumulate them indefinitely.
+        if len(self.command_cache) > 1024:
+            self.command_cache.clear()
+        entry = self.command_cache.get(id(command))
+        if entry is not None:
+            return entry[1]
+        if isinstance(command, Value):
+            source = _RHSValueCompiler.compile(self.state, command, mode="curr")
+        else:
+            source = _StatementCompiler.compile(self.state, command)
+        code = compile(source, "<string>", "exec")
+        self.command_cache[id(command)] = (command, code)
+        return code
+
     def add_trigger(self, signal, trigger=None):
         self.state.add_trigger(self, signal, trigger=trigger)
         self.waits_on.add(signal)
@@ -52,74 +85,117 @@ class PyCoroProcess(BaseProcess):
             self.state.remove_trigger(self, signal)
         self.waits_on.clear()
 
+    # Command handlers, dispatched by exact command type through _COMMAND_HANDLERS below.
+    # A handler returns True if the process suspends on the command.
+
+    def _handle_tick(self, command):
+        domain = command.domain
+        if isinstance(domain, ClockDomain):
+            clk = domain.clk
+            clk_trigger = 1 if domain.clk_edge == "pos" else 0
+            async_rst = domain.rst if domain.rst is not None and domain.async_reset else None
+        else:
+            try:
+                clk, clk_trigger, async_rst = self.domain_triggers[domain]
+            except KeyError:
+                raise NameError("Received command {!r} that refers to a nonexistent "
+                                "domain {!r} from process {!r}"
+                                .format(command, command.domain, self.src_loc())) from None
+        self.add_trigger(clk, trigger=clk_trigger)
+        if async_rst is not None:
+            self.add_trigger(async_rst, trigger=1)
+        return True
+
+    def _handle_settle(self, command):
+        self.state.wait_interval(self, None)
+        return True
+
+    def _handle_delay(self, command):
+        # Internal timeline is in 1ps integeral units, intervals are public API and in floating point
+        interval = int(command.interval * 1e12) if command.interval is not None else None
+        self.state.wait_interval(self, interval)
+        return True
+
+    def _handle_passive(self, command):
+        if not self.passive:
+            self.passive = True
+            self.state.active_count -= 1
+
+    def _handle_active(self, command):
+        if self.passive:
+            self.passive = False
+            self.state.active_count += 1
+
     def run(self):
-        if self.coroutine is None:
+        coroutine = self.coroutine
+        if coroutine is None:
             return
 
         self.clear_triggers()
 
+        # Dispatch the startup command, if any, before the coroutine runs at all. This lets
+        # add_process and add_sync_process delay process startup without wrapping the user
+        # generator in another one, which would cost an extra frame on every send() after.
+        startup_cmd = self.startup_cmd
+        if startup_cmd is not None:
+            self.startup_cmd = None
+            if _COMMAND_HANDLERS[type(startup_cmd)](self, startup_cmd):
+                return
+
+        # The loop below runs once per yield; bind the attributes it reads on every iteration
+        # to locals up front, as attribute loads are not free in CPython.
+        send = coroutine.send
+        default_cmd = self.default_cmd
+        exec_locals = self.exec_locals
+
         response = None
         while True:
             try:
-                command = self.coroutine.send(response)
+                command = send(response)
                 if command is None:
-                    command = self.default_cmd
+                    command = default_cmd
                 response = None
 
                 if isinstance(command, Value):
-                    exec(_RHSValueCompiler.compile(self.state, command, mode="curr"),
-                        self.exec_locals)
-                    response = Const.normalize(self.exec_locals["result"], command.shape())
+                    exec(self.compile_command(command), exec_locals)
+                    response = Const.normalize(exec_locals["result"], command.shape())
 
                 elif isinstance(command, Statement):
-                    exec(_StatementCompiler.compile(self.state, command),
-                        self.exec_locals)
-
-                elif type(command) is Tick:
-                    domain = command.domain
-                    if isinstance(domain, ClockDomain):
-                        pass
-                    elif domain in self.domains:
-                        domain = self.domains[domain]
-                    else:
-                        raise NameError("Received command {!r} that refers to a nonexistent "
-                                        "domain {!r} from process {!r}"
-                                        .format(command, command.domain, self.src_loc()))
-                    self.add_trigger(domain.clk, trigger=1 if domain.clk_edge == "pos" else 0)
-                    if domain.rst is not None and domain.async_reset:
-                        self.add_trigger(domain.rst, trigger=1)
-                    return
-
-                elif type(command) is Settle:
-                    self.state.wait_interval(self, None)
-                    return
-
-                elif type(command) is Delay:
-                    # Internal timeline is in 1ps integeral units, intervals are public API and in floating point
-                    interval = int(command.interval * 1e12) if command.interval is not None else None
-                    self.state.wait_interval(self, interval)
-                    return
-
-                elif type(command) is Passive:
-                    self.passive = True
+                    exec(self.compile_command(command), exec_locals)
 
-                elif type(command) is Active:
-                    self.passive = False
+                else:
+                    handler = _COMMAND_HANDLERS.get(type(command))
+                    if handler is not None:
+                        if handler(self, command):
+                            return
 
-                elif command is None: # only possible if self.default_cmd is None
-                    raise TypeError("Received default command from process {!r} that was added "
-                                    "with add_process(); did you mean to add this process with "
-                                    "add_sync_process() instead?"
-                                    .format(self.src_loc()))
+                    elif command is None: # only possible if self.default_cmd is None
+                        raise TypeError("Received default command from process {!r} that was "
+                                        "added with add_process(); did you mean to add this "
+                                        "process with add_sync_process() instead?"
+                                        .format(self.src_loc()))
 
-                else:
-                    raise TypeError("Received unsupported command {!r} from process {!r}"
-                                    .format(command, self.src_loc()))
+                    else:
+                        raise TypeError("Received unsupported command {!r} from process {!r}"
+                                        .format(command, self.src_loc()))
 
             except StopIteration:
-                self.passive = True
+                if not self.passive:
+                    self.passive = True
+                    self.state.active_count -= 1
                 self.coroutine = None
                 return
 
             except Exception as exn:
-                self.coroutine.throw(exn)
+                coroutine.throw(exn)
+
+
+# A single dict lookup keyed by exact command type replaces a chain of type() comparisons
+# on the hot path. Commands are simple final classes, so exact-type dispatch is safe.
+_COMMAND_HANDLERS = {
+    Tick:    PyCoroProcess._handle_tick,
+    Settle:  PyCoroProcess._handle_settle,
+    Delay:   PyCoroProcess._handle_delay,
+    Passive: PyCoroProcess._handle_passive,
+    Active:  PyCoroProcess._handle_active,
+}
@@ -1,9 +1,12 @@
 import os
+import sys
 import tempfile
+import linecache
 from contextlib import contextmanager
+from itertools import count
 
 from ..hdl import *
-from ..hdl.ast import SignalSet
+from ..hdl.ast import Operator, Slice, Part, SignalSet
 from ..hdl.xfrm import ValueVisitor, StatementVisitor, LHSGroupFilter
 from ._base import BaseProcess
 
@@ -11,6 +14,10 @@ from ._base import BaseProcess
 __all__ = ["PyRTLProcess"]
 
 
+# Distinguishes the virtual filenames of compiled processes in tracebacks and profiles.
+_compiled_code_count = count()
+
+
 class PyRTLProcess(BaseProcess):
     __slots__ = ("is_comb", "runnable", "passive", "run")
 
@@ -65,7 +72,6 @@ class _Compiler:
 
 class _ValueCompiler(ValueVisitor, _Compiler):
     helpers = {
-        "sign": lambda value, sign: value | sign if value & sign else value,
         "zdiv": lambda lhs, rhs: 0 if rhs == 0 else lhs // rhs,
         "zmod": lambda lhs, rhs: 0 if rhs == 0 else lhs % rhs,
     }
@@ -113,23 +119,50 @@ class _RHSValueCompiler(_ValueCompiler):
     def on_Const(self, value):
         return f"{value.value}"
 
-    def on_Signal(self, value):
-        if self.inputs is not None:
-            self.inputs.add(value)
+    def is_bounded(self, value):
+        # Check whether the expression emitted for `value` is already known to be nonnegative
+        # and to fit in `len(value)` bits, in which case masking it again is redundant.
+        if isinstance(value, Const):
+            return value.value >= 0
+        if isinstance(value, Signal):
+            # Signal values are normalized on assignment; unsigned ones are in range.
+            return not value.shape().signed
+        if isinstance(value, (Slice, Part, Cat, Repl)):
+            # These always emit a masked expression.
+            return True
+        if isinstance(value, Operator):
+            if value.operator in ("b", "r|", "r&", "r^",
+                                  "==", "!=", "<", "<=", ">", ">="):
+                return True
+            if value.operator in ("u", "s"):
+                # These pass the emitted expression of their operand through unchanged.
+                return self.is_bounded(value.operands[0])
+        return False
 
+    def on_Signal(self, value):
         if self.mode == "curr":
-            return f"slots[{self.state.get_signal(value)}].{self.mode}"
+            if self.inputs is not None:
+                self.inputs.add(value)
+                # The value is bound to a local at the start of the generated function; a bare
+                # local load is much cheaper than a subscript plus an attribute load.
+                return f"curr_{self.state.get_signal(value)}"
+            return f"slots[{self.state.get_signal(value)}].curr"
         else:
             return f"next_{self.state.get_signal(value)}"
 
     def on_Operator(self, value):
         def mask(value):
+            if self.is_bounded(value):
+                return self(value)
             value_mask = (1 << len(value)) - 1
             return f"({value_mask} & {self(value)})"
 
         def sign(value):
             if value.shape().signed:
-                return f"sign({mask(value)}, {-1 << (len(value) - 1)})"
+                # Branchless sign extension: subtracting out a toggled sign bit avoids both
+                # a Python-level helper call and a branch in the generated code.
+                sign_bit = 1 << (len(value) - 1)
+                return f"(({mask(value)} ^ {sign_bit}) - {sign_bit})"
             else: # unsigned
                 return mask(value)
 
@@ -146,8 +179,13 @@ class _RHSValueCompiler(_ValueCompiler):
             if value.operator == "r&":
                 return f"({(1 << len(arg)) - 1} == {mask(arg)})"
             if value.operator == "r^":
-                # Believe it or not, this is the fastest way to compute a sideways XOR in Python.
-                return f"(format({mask(arg)}, 'b').count('1') % 2)"
+                if sys.version_info >= (3, 10):
+                    # int.bit_count() is a C-level popcount; it covers arbitrarily wide
+                    # values by iterating 64-bit limbs without re-entering Python.
+                    return f"(({mask(arg)}).bit_count() & 1)"
+                # Believe it or not, this is the fastest way to compute a sideways XOR in Python
+                # without bit_count().
+                return f"(bin({mask(arg)}).count('1') & 1)"
             if value.operator in ("u", "s"):
                 # These operators don't change the bit pattern, only its interpretation.
                 return self(arg)
@@ -192,11 +230,19 @@ class _RHSValueCompiler(_ValueCompiler):
         raise NotImplementedError("Operator '{}' not implemented".format(value.operator)) # :nocov:
 
     def on_Slice(self, value):
+        if value.start == 0:
+            if len(value) == len(value.value) and self.is_bounded(value.value):
+                return self(value.value)
+            return f"({(1 << len(value)) - 1} & {self(value.value)})"
         return f"({(1 << len(value)) - 1} & ({self(value.value)} >> {value.start}))"
 
     def on_Part(self, value):
-        offset_mask = (1 << len(value.offset)) - 1
-        offset = f"({value.stride} * ({offset_mask} & {self(value.offset)}))"
+        if self.is_bounded(value.offset):
+            offset = self(value.offset)
+        else:
+            offset = f"({(1 << len(value.offset)) - 1} & {self(value.offset)})"
+        if value.stride != 1:
+            offset = f"({value.stride} * {offset})"
         return f"({(1 << value.width) - 1} & " \
                f"{self(value.value)} >> {offset})"
 
@@ -204,20 +250,32 @@ class _RHSValueCompiler(_ValueCompiler):
         gen_parts = []
         offset = 0
         for part in value.parts:
-            part_mask = (1 << len(part)) - 1
-            gen_parts.append(f"(({part_mask} & {self(part)}) << {offset})")
+            if self.is_bounded(part):
+                gen_part = self(part)
+            else:
+                gen_part = f"({(1 << len(part)) - 1} & {self(part)})"
+            if offset == 0:
+                gen_parts.append(gen_part)
+            else:
+                gen_parts.append(f"({gen_part} << {offset})")
             offset += len(part)
         if gen_parts:
             return f"({' | '.join(gen_parts)})"
         return f"0"
 
     def on_Repl(self, value):
-        part_mask = (1 << len(value.value)) - 1
-        gen_part = self.emitter.def_var("repl", f"{part_mask} & {self(value.value)}")
+        if self.is_bounded(value.value):
+            gen_value = self(value.value)
+        else:
+            gen_value = f"{(1 << len(value.value)) - 1} & {self(value.value)}"
+        gen_part = self.emitter.def_var("repl", gen_value)
         gen_parts = []
         offset = 0
         for _ in range(value.count):
-            gen_parts.append(f"({gen_part} << {offset})")
+            if offset == 0:
+                gen_parts.append(gen_part)
+            else:
+                gen_parts.append(f"({gen_part} << {offset})")
             offset += len(value.value)
         if gen_parts:
             return f"({' | '.join(gen_parts)})"
@@ -245,9 +303,16 @@ class _RHSValueCompiler(_ValueCompiler):
     @classmethod
     def compile(cls, state, value, *, mode):
         emitter = _PythonEmitter()
-        compiler = cls(state, emitter, mode=mode)
+        inputs = SignalSet() if mode == "curr" else None
+        compiler = cls(state, emitter, mode=mode, inputs=inputs)
         emitter.append(f"result = {compiler(value)}")
-        return emitter.flush()
+        # The inputs are only known after compilation; bind them before the compiled body.
+        preamble = _PythonEmitter()
+        if inputs is not None:
+            for signal in inputs:
+                signal_index = state.get_signal(signal)
+                preamble.append(f"curr_{signal_index} = slots[{signal_index}].curr")
+        return preamble.flush() + emitter.flush()
 
 
 class _LHSValueCompiler(_ValueCompiler):
@@ -272,7 +337,8 @@ class _LHSValueCompiler(_ValueCompiler):
         def gen(arg):
             value_mask = (1 << len(value)) - 1
             if value.shape().signed:
-                value_sign = f"sign({value_mask} & {arg}, {-1 << (len(value) - 1)})"
+                sign_bit = 1 << (len(value) - 1)
+                value_sign = f"((({value_mask} & {arg}) ^ {sign_bit}) - {sign_bit})"
             else: # unsigned
                 value_sign = f"{value_mask} & {arg}"
             self.emitter.append(f"next_{self.state.get_signal(value)} = {value_sign}")
@@ -292,8 +358,12 @@ class _LHSValueCompiler(_ValueCompiler):
     def on_Part(self, value):
         def gen(arg):
             width_mask = (1 << value.width) - 1
-            offset_mask = (1 << len(value.offset)) - 1
-            offset = f"({value.stride} * ({offset_mask} & {self.rrhs(value.offset)}))"
+            if self.rrhs.is_bounded(value.offset):
+                offset = self.rrhs(value.offset)
+            else:
+                offset = f"({(1 << len(value.offset)) - 1} & {self.rrhs(value.offset)})"
+            if value.stride != 1:
+                offset = f"({value.stride} * {offset})"
             self(value.value)(f"({self.lrhs(value.value)} & " \
                 f"~({width_mask} << {offset}) | " \
                 f"(({width_mask} & {arg}) << {offset}))")
@@ -346,27 +416,41 @@ class _StatementCompiler(StatementVisitor, _Compiler):
 
     def on_Assign(self, stmt):
         gen_rhs_value = self.rhs(stmt.rhs) # check for oversized value before generating mask
-        gen_rhs = f"({(1 << len(stmt.rhs)) - 1} & {gen_rhs_value})"
+        if self.rhs.is_bounded(stmt.rhs):
+            gen_rhs = gen_rhs_value
+        else:
+            gen_rhs = f"({(1 << len(stmt.rhs)) - 1} & {gen_rhs_value})"
         if stmt.rhs.shape().signed:
-            gen_rhs = f"sign({gen_rhs}, {-1 << (len(stmt.rhs) - 1)})"
+            sign_bit = 1 << (len(stmt.rhs) - 1)
+            gen_rhs = f"(({gen_rhs} ^ {sign_bit}) - {sign_bit})"
         return self.lhs(stmt.lhs)(gen_rhs)
 
     def on_Switch(self, stmt):
         gen_test_value = self.rhs(stmt.test) # check for oversized value before generating mask
-        gen_test = self.emitter.def_var("test", f"{(1 << len(stmt.test)) - 1} & {gen_test_value}")
+        if self.rhs.is_bounded(stmt.test):
+            gen_test = self.emitter.def_var("test", gen_test_value)
+        else:
+            gen_test = self.emitter.def_var("test",
+                f"{(1 << len(stmt.test)) - 1} & {gen_test_value}")
         for index, (patterns, stmts) in enumerate(stmt.cases.items()):
             gen_checks = []
             if not patterns:
                 gen_checks.append(f"True")
             else:
+                exact_values = []
                 for pattern in patterns:
                     if "-" in pattern:
                         mask  = int("".join("0" if b == "-" else "1" for b in pattern), 2)
                         value = int("".join("0" if b == "-" else  b  for b in pattern), 2)
                         gen_checks.append(f"{value} == ({mask} & {gen_test})")
                     else:
-                        value = int(pattern, 2)
-                        gen_checks.append(f"{value} == {gen_test}")
+                        exact_values.append(int(pattern, 2))
+                if len(exact_values) == 1:
+                    gen_checks.insert(0, f"{exact_values[0]} == {gen_test}")
+                elif exact_values:
+                    # A single containment test over a constant tuple is evaluated entirely
+                    # at the C level, unlike the equivalent chain of == comparisons.
+                    gen_checks.insert(0, f"{gen_test} in {tuple(exact_values)}")
             if index == 0:
                 self.emitter.append(f"if {' or '.join(gen_checks)}:")
             else:
@@ -385,15 +469,24 @@ class _StatementCompiler(StatementVisitor, _Compiler):
 
     @classmethod
     def compile(cls, state, stmt):
-        output_indexes = [state.get_signal(signal) for signal in stmt._lhs_signals()]
         emitter = _PythonEmitter()
-        for signal_index in output_indexes:
-            emitter.append(f"next_{signal_index} = slots[{signal_index}].next")
-        compiler = cls(state, emitter)
+        inputs, outputs = SignalSet(), SignalSet()
+        compiler = cls(state, emitter, inputs=inputs, outputs=outputs)
+        # The visitor populates `inputs` and `outputs` while emitting code, which avoids
+        # a separate _lhs_signals() traversal of the statement tree.
         compiler(stmt)
+        output_indexes = [state.get_signal(signal) for signal in outputs]
         for signal_index in output_indexes:
             emitter.append(f"slots[{signal_index}].set(next_{signal_index})")
-        return emitter.flush()
+        # The inputs and outputs are only known after compilation; bind them before the
+        # compiled body.
+        preamble = _PythonEmitter()
+        for signal in inputs:
+            signal_index = state.get_signal(signal)
+            preamble.append(f"curr_{signal_index} = slots[{signal_index}].curr")
+        for signal_index in output_indexes:
+            preamble.append(f"next_{signal_index} = slots[{signal_index}].next")
+        return preamble.flush() + emitter.flush()
 
 
 class _FragmentCompiler:
@@ -401,22 +494,24 @@ class _FragmentCompiler:
         self.state = state
 
     def __call__(self, fragment):
-        processes = set()
+        # Processes are kept in a list: every delta cycle iterates it, and iterating a compact
+        # list in a stable order is both cheaper and more reproducible than walking a set.
+        processes = list()
 
         for domain_name, domain_signals in fragment.drivers.items():
             domain_stmts = LHSGroupFilter(domain_signals)(fragment.statements)
             domain_process = PyRTLProcess(is_comb=domain_name is None)
 
+            # Resolve every driven signal to its slot up front; each get_signal() call is
+            # a SignalDict lookup, and the indexes are needed several times below.
+            domain_signal_indexes = [(signal, self.state.get_signal(signal))
+                                     for signal in domain_signals]
+
             emitter = _PythonEmitter()
-            emitter.append(f"def run():")
-            emitter._level += 1
+            emitter._level += 2 # body of run(); the header is emitted once the inputs are known
 
+            inputs = SignalSet()
             if domain_name is None:
-                for signal in domain_signals:
-                    signal_index = self.state.get_signal(signal)
-                    emitter.append(f"next_{signal_index} = {signal.reset}")
-
-                inputs = SignalSet()
                 _StatementCompiler(self.state, emitter, inputs=inputs)(domain_stmts)
 
                 for input in inputs:
@@ -430,36 +525,56 @@ class _FragmentCompiler:
                     rst_trigger = 1
                     self.state.add_trigger(domain_process, domain.rst, trigger=rst_trigger)
 
-                for signal in domain_signals:
-                    signal_index = self.state.get_signal(signal)
-                    emitter.append(f"next_{signal_index} = slots[{signal_index}].next")
-
-                _StatementCompiler(self.state, emitter)(domain_stmts)
+                _StatementCompiler(self.state, emitter, inputs=inputs)(domain_stmts)
 
-            for signal in domain_signals:
-                signal_index = self.state.get_signal(signal)
+            for signal, signal_index in domain_signal_indexes:
                 emitter.append(f"slots[{signal_index}].set(next_{signal_index})")
+            body = emitter.flush()
+            emitter._level -= 2
+
+            # run() is emitted as a closure so that references to the slot list and to the
+            # helpers compile to fast cell loads rather than global dictionary lookups.
+            emitter.append(f"def _make_run(slots, zdiv, zmod):")
+            with emitter.indent():
+                emitter.append(f"def run():")
+                with emitter.indent():
+                    for input in inputs:
+                        signal_index = self.state.get_signal(input)
+                        emitter.append(f"curr_{signal_index} = slots[{signal_index}].curr")
+                    for signal, signal_index in domain_signal_indexes:
+                        if domain_name is None:
+                            emitter.append(f"next_{signal_index} = {signal.reset}")
+                        else:
+                            emitter.append(f"next_{signal_index} = slots[{signal_index}].next")
+            header = emitter.flush()
+            with emitter.indent():
+                emitter.append(f"return run")
 
             # There shouldn't be any exceptions raised by the generated code, but if there are
             # (almost certainly due to a bug in the code generator), use this environment variable
-            # to make backtraces useful.
-            code = emitter.flush()
+            # to write the code to a file and make backtraces useful.
+            code = header + body + emitter.flush()
             if os.getenv("AMARANTH_pysim_dump"):
                 file = tempfile.NamedTemporaryFile("w", prefix="amaranth_pysim_", delete=False)
                 file.write(code)
                 filename = file.name
             else:
-                filename = "<string>"
+                # Register the code with linecache under a unique virtual filename, so that
+                # tracebacks and profilers can still show the generated source.
+                filename = "<pysim_{}>".format(next(_compiled_code_count))
+                linecache.cache[filename] = (len(code), None,
+                                             code.splitlines(keepends=True), filename)
 
-            exec_locals = {"slots": self.state.slots, **_ValueCompiler.helpers}
+            exec_locals = {}
             exec(compile(code, filename, "exec"), exec_locals)
-            domain_process.run = exec_locals["run"]
+            domain_process.run = exec_locals["_make_run"](self.state.slots,
+                                                          **_ValueCompiler.helpers)
 
-            processes.add(domain_process)
+            processes.append(domain_process)
 
         for subfragment_index, (subfragment, subfragment_name) in enumerate(fragment.subfragments):
             if subfragment_name is None:
                 subfragment_name = "U${}".format(subfragment_index)
-            processes.update(self(subfragment))
+            processes.extend(self(subfragment))
 
         return processes
@@ -11,15 +11,28 @@ __all__ = ["Settle", "Delay", "Tick", "Passive", "Active", "Simulator"]
 
 
 class Command:
-    pass
+    __slots__ = ()
 
 
 class Settle(Command):
+    # Settle carries no state, so testbenches yielding it in a tight loop all share one
+    # instance instead of allocating a fresh object per yield.
+    __slots__ = ()
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
     def __repr__(self):
         return "(settle)"
 
 
 class Delay(Command):
+    __slots__ = ("interval",)
+
     def __init__(self, interval=None):
         self.interval = None if interval is None else float(interval)
 
@@ -31,6 +44,8 @@ class Delay(Command):
 
 
 class Tick(Command):
+    __slots__ = ("domain",)
+
     def __init__(self, domain="sync"):
         if not isinstance(domain, (str, ClockDomain)):
             raise TypeError("Domain must be a string or a ClockDomain instance, not {!r}"
@@ -43,11 +58,29 @@ class Tick(Command):
 
 
 class Passive(Command):
+    __slots__ = ()
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
     def __repr__(self):
         return "(passive)"
 
 
 class Active(Command):
+    __slots__ = ()
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
     def __repr__(self):
         return "(active)"
 
@@ -69,6 +102,12 @@ class Simulator:
         self._clocked  = set()
 
     def _check_process(self, process):
+        # Fast path: a plain generator or coroutine function carries the corresponding flag
+        # right on its code object. Fall back to the inspect predicates for anything wrapped
+        # (e.g. a functools.partial), which they know how to unwrap.
+        code = getattr(process, "__code__", None)
+        if code is not None and code.co_flags & (inspect.CO_GENERATOR | inspect.CO_COROUTINE):
+            return process
         if not (inspect.isgeneratorfunction(process) or inspect.iscoroutinefunction(process)):
             raise TypeError("Cannot add a process {!r} because it is not a generator function"
                             .format(process))
@@ -76,20 +115,17 @@ class Simulator:
 
     def add_process(self, process):
         process = self._check_process(process)
-        def wrapper():
-            # Only start a bench process after comb settling, so that the reset values are correct.
-            yield Settle()
-            yield from process()
-        self._engine.add_coroutine_process(wrapper, default_cmd=None)
+        # Only start a bench process after comb settling, so that the reset values are correct.
+        # The engine dispatches the startup command itself rather than having a wrapper
+        # generator yield it, which would put an extra frame on every resumption.
+        self._engine.add_coroutine_process(process, default_cmd=None, first_cmd=Settle())
 
     def add_sync_process(self, process, *, domain="sync"):
         process = self._check_process(process)
-        def wrapper():
-            # Only start a sync process after the first clock edge (or reset edge, if the domain
-            # uses an asynchronous reset). This matches the behavior of synchronous FFs.
-            yield Tick(domain)
-            yield from process()
-        self._engine.add_coroutine_process(wrapper, default_cmd=Tick(domain))
+        # Only start a sync process after the first clock edge (or reset edge, if the domain
+        # uses an asynchronous reset). This matches the behavior of synchronous FFs.
+        tick = Tick(domain)
+        self._engine.add_coroutine_process(process, default_cmd=tick, first_cmd=tick)
 
     def add_clock(self, period, *, phase=None, domain="sync", if_exists=False):
         """Add a clock process.
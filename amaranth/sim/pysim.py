@@ -1,4 +1,6 @@
+from collections import deque
 from contextlib import contextmanager
+import heapq
 import itertools
 import re
 from vcd import VCDWriter
@@ -52,16 +54,23 @@ class _VCDWriter:
     def decode_to_vcd(signal, value):
         return signal.decoder(value).expandtabs().replace(" ", "_")
 
-    def __init__(self, fragment, *, vcd_file, gtkw_file=None, traces=()):
+    def __init__(self, state, fragment, *, vcd_file, gtkw_file=None, traces=()):
         if isinstance(vcd_file, str):
-            vcd_file = open(vcd_file, "wt")
+            # The VCD file is written to with many small writes, once per signal change; use
+            # a large buffer to amortize their cost and that of the underlying syscalls.
+            vcd_file = open(vcd_file, "wt", buffering=128 * 1024)
         if isinstance(gtkw_file, str):
             gtkw_file = open(gtkw_file, "wt")
 
+        self.state = state
         self.vcd_vars = SignalDict()
+        self.vcd_slot_vars = []
         self.vcd_file = vcd_file
         self.vcd_writer = vcd_file and VCDWriter(self.vcd_file,
             timescale="1 ps", comment="Generated by Amaranth")
+        # Bound once here; update() is called for every signal change, and re-resolving the
+        # method through two attribute loads there adds up.
+        self.vcd_change = self.vcd_writer.change if self.vcd_writer else None
 
         self.gtkw_names = SignalDict()
         self.gtkw_file = gtkw_file
@@ -118,16 +127,33 @@ class _VCDWriter:
                 if signal not in self.gtkw_names:
                     self.gtkw_names[signal] = (*var_scope, var_name_suffix)
 
-    def update(self, timestamp, signal, value):
-        vcd_var = self.vcd_vars.get(signal)
-        if vcd_var is None:
+        # update() is called for every signal change, and looking the variable up through
+        # a SignalDict there hashes the signal on each call; resolve the variables into a
+        # slot-indexed list once instead. Slots assigned after this point (by testbenches
+        # touching signals outside the design) are resolved on first change.
+        self._extend_slot_vars()
+
+    def _extend_slot_vars(self):
+        for signal_state in self.state.slots[len(self.vcd_slot_vars):]:
+            vcd_var = self.vcd_vars.get(signal_state.signal)
+            self.vcd_slot_vars.append(
+                None if vcd_var is None else (vcd_var, signal_state.signal))
+
+    def update(self, timestamp, signal_state):
+        try:
+            entry = self.vcd_slot_vars[signal_state.index]
+        except IndexError:
+            self._extend_slot_vars()
+            entry = self.vcd_slot_vars[signal_state.index]
+        if entry is None:
             return
 
+        vcd_var, signal = entry
         if signal.decoder:
-            var_value = self.decode_to_vcd(signal, value)
+            var_value = self.decode_to_vcd(signal, signal_state.curr)
         else:
-            var_value = value
-        self.vcd_writer.change(vcd_var, timestamp, var_value)
+            var_value = signal_state.curr
+        self.vcd_change(vcd_var, timestamp, var_value)
 
     def close(self, timestamp):
         if self.vcd_writer is not None:
@@ -152,17 +178,27 @@ class _VCDWriter:
 
 
 class _Timeline:
-    def __init__(self):
+    def __init__(self, runnables):
         self.now = 0
+        self.runnables = runnables
+        # The heap holds (deadline, sequence number, process) entries; the sequence number
+        # breaks ties so that processes themselves are never compared. A suspended process has
+        # exactly one outstanding deadline (enforced in at()), so every entry is live and
+        # advance() never needs to skip over stale ones. The dict backs that invariant.
         self.deadlines = dict()
+        self.heap = []
+        self.seq = itertools.count()
 
     def reset(self):
         self.now = 0
         self.deadlines.clear()
+        self.heap.clear()
 
     def at(self, run_at, process):
         assert process not in self.deadlines
+        assert run_at >= self.now
         self.deadlines[process] = run_at
+        heapq.heappush(self.heap, (run_at, next(self.seq), process))
 
     def delay(self, delay_by, process):
         if delay_by is None:
@@ -172,104 +208,150 @@ class _Timeline:
         self.at(run_at, process)
 
     def advance(self):
-        nearest_processes = set()
-        nearest_deadline = None
-        for process, deadline in self.deadlines.items():
-            if deadline is None:
-                if nearest_deadline is not None:
-                    nearest_processes.clear()
-                nearest_processes.add(process)
-                nearest_deadline = self.now
-                break
-            elif nearest_deadline is None or deadline <= nearest_deadline:
-                assert deadline >= self.now
-                if nearest_deadline is not None and deadline < nearest_deadline:
-                    nearest_processes.clear()
-                nearest_processes.add(process)
-                nearest_deadline = deadline
-
-        if not nearest_processes:
+        heap = self.heap
+        if not heap:
             return False
 
-        for process in nearest_processes:
-            process.runnable = True
+        # Pop the earliest deadline, then any others that are due at the same time.
+        nearest_deadline = heap[0][0]
+        while heap and heap[0][0] == nearest_deadline:
+            _, _, process = heapq.heappop(heap)
             del self.deadlines[process]
+            if not process.runnable:
+                process.runnable = True
+                self.runnables.append(process)
         self.now = nearest_deadline
 
         return True
 
 
 class _PySignalState(BaseSignalState):
-    __slots__ = ("signal", "curr", "next", "waiters", "pending")
-
-    def __init__(self, signal, pending):
+    # Values are stored as plain Python ints, normalized to the signal shape on assignment:
+    # unsigned signals hold their bit pattern, signed signals are kept sign-extended (i.e.
+    # negative where the sign bit is set). Signals of any width share this representation;
+    # generated code relies on it to avoid re-normalizing on every read.
+    __slots__ = ("signal", "index", "curr", "next", "dirty",
+                 "waiters", "waiters_any", "waiters_on", "pending")
+
+    def __init__(self, signal, index, pending):
         self.signal = signal
+        self.index = index
         self.pending = pending
+        # `waiters` maps process to trigger and is the source of truth; `waiters_any` (wake on
+        # any change) and `waiters_on` (wake on a specific value, keyed by it) are derived from
+        # it, so that the commit sweep does not compare triggers waiter by waiter.
         self.waiters = dict()
+        self.waiters_any = list()
+        self.waiters_on = dict()
         self.curr = self.next = signal.reset
+        self.dirty = False
+
+    def add_waiter(self, process, trigger):
+        assert process not in self.waiters or self.waiters[process] == trigger
+        if process not in self.waiters:
+            self.waiters[process] = trigger
+            if trigger is None:
+                self.waiters_any.append(process)
+            else:
+                self.waiters_on.setdefault(trigger, []).append(process)
+
+    def remove_waiter(self, process):
+        assert process in self.waiters
+        trigger = self.waiters.pop(process)
+        if trigger is None:
+            self.waiters_any.remove(process)
+        else:
+            self.waiters_on[trigger].remove(process)
 
     def set(self, value):
         if self.next == value:
             return
         self.next = value
-        self.pending.add(self)
-
-    def commit(self):
-        if self.curr == self.next:
-            return False
-        self.curr = self.next
-
-        awoken_any = False
-        for process, trigger in self.waiters.items():
-            if trigger is None or trigger == self.curr:
-                process.runnable = awoken_any = True
-        return awoken_any
+        # The dirty flag keeps a state that is toggled several times between commits (e.g. by
+        # combinational glitching) from being appended to the pending list more than once; it
+        # is cleared again by the commit sweep.
+        if not self.dirty:
+            self.dirty = True
+            self.pending.append(self)
 
 
 class _PySimulation(BaseSimulation):
     def __init__(self):
-        self.timeline = _Timeline()
-        self.signals  = SignalDict()
-        self.slots    = []
-        self.pending  = set()
+        # Queue of processes that are ready to run. A process appears here at most once; the
+        # `runnable` flag on the process guards against double enqueueing. Having the producers
+        # (commit wakeups, timeline expiry) enqueue explicitly means the scheduler only touches
+        # the processes that can actually run, not every process in the simulation.
+        self.runnables = deque()
+        self.timeline  = _Timeline(self.runnables)
+        self.signals   = SignalDict()
+        self.slots     = []
+        self.pending   = list()
+        # Number of non-passive processes, maintained by the engine and by the processes as
+        # they change their passivity, so that deciding whether the simulation is done does
+        # not require scanning every process on every step.
+        self.active_count = 0
 
     def reset(self):
         self.timeline.reset()
         for signal, index in self.signals.items():
-            self.slots[index].curr = self.slots[index].next = signal.reset
+            signal_state = self.slots[index]
+            signal_state.curr = signal_state.next = signal.reset
+            signal_state.dirty = False
         self.pending.clear()
+        self.runnables.clear()
+        self.active_count = 0
 
     def get_signal(self, signal):
         try:
             return self.signals[signal]
         except KeyError:
             index = len(self.slots)
-            self.slots.append(_PySignalState(signal, self.pending))
+            self.slots.append(_PySignalState(signal, index, self.pending))
             self.signals[signal] = index
             return index
 
     def add_trigger(self, process, signal, *, trigger=None):
         index = self.get_signal(signal)
-        assert (process not in self.slots[index].waiters or
-                self.slots[index].waiters[process] == trigger)
-        self.slots[index].waiters[process] = trigger
+        self.slots[index].add_waiter(process, trigger)
 
     def remove_trigger(self, process, signal):
         index = self.get_signal(signal)
-        assert process in self.slots[index].waiters
-        del self.slots[index].waiters[process]
+        self.slots[index].remove_waiter(process)
 
     def wait_interval(self, process, interval):
         self.timeline.delay(interval, process)
 
     def commit(self, changed=None):
+        # The commit sweep is split in two phases: first propagate every pending value in one
+        # batch, collecting the states that actually changed, then wake up waiters only for
+        # those states. This keeps the (much more common) unchanged states out of the wakeup
+        # loop entirely.
+        pending = self.pending
+        changed_states = []
+        for signal_state in pending:
+            signal_state.dirty = False
+            next_value = signal_state.next
+            if signal_state.curr != next_value:
+                signal_state.curr = next_value
+                changed_states.append(signal_state)
+        pending.clear()
+
         converged = True
-        for signal_state in self.pending:
-            if signal_state.commit():
-                converged = False
+        runnables = self.runnables
+        for signal_state in changed_states:
+            for process in signal_state.waiters_any:
+                if not process.runnable:
+                    process.runnable = True
+                    runnables.append(process)
+                    converged = False
+            for process in signal_state.waiters_on.get(signal_state.curr, ()):
+                if not process.runnable:
+                    process.runnable = True
+                    runnables.append(process)
+                    converged = False
+
         if changed is not None:
-            changed.update(self.pending)
-        self.pending.clear()
+            changed.update(changed_states)
         return converged
 
 
@@ -280,45 +362,64 @@ class PySimEngine(BaseEngine):
 
         self._fragment = fragment
         self._processes = _FragmentCompiler(self._state)(self._fragment)
+        for process in self._processes:
+            if process.runnable:
+                self._state.runnables.append(process)
+            if not process.passive:
+                self._state.active_count += 1
         self._vcd_writers = []
 
-    def add_coroutine_process(self, process, *, default_cmd):
-        self._processes.add(PyCoroProcess(self._state, self._fragment.domains, process,
-                                          default_cmd=default_cmd))
+    def _add_process(self, process):
+        self._processes.append(process)
+        if process.runnable:
+            self._state.runnables.append(process)
+        if not process.passive:
+            self._state.active_count += 1
+
+    def add_coroutine_process(self, process, *, default_cmd, first_cmd=None):
+        self._add_process(PyCoroProcess(self._state, self._fragment.domains, process,
+                                        default_cmd=default_cmd, first_cmd=first_cmd))
 
     def add_clock_process(self, clock, *, phase, period):
-        self._processes.add(PyClockProcess(self._state, clock,
-                                           phase=phase, period=period))
+        self._add_process(PyClockProcess(self._state, clock,
+                                         phase=phase, period=period))
 
     def reset(self):
         self._state.reset()
         for process in self._processes:
             process.reset()
+            if process.runnable:
+                self._state.runnables.append(process)
+            if not process.passive:
+                self._state.active_count += 1
 
     def _step(self):
         changed = set() if self._vcd_writers else None
 
-        # Performs the two phases of a delta cycle in a loop:
+        # Performs the two phases of a delta cycle in a loop. The loop may run many times per
+        # step on combinational-heavy designs, so its invariants are bound to locals up front.
+        runnables = self._state.runnables
+        commit = self._state.commit
         converged = False
         while not converged:
-            # 1. eval: run and suspend every non-waiting process once, queueing signal changes
-            for process in self._processes:
-                if process.runnable:
-                    process.runnable = False
-                    process.run()
+            # 1. eval: run and suspend every runnable process once, queueing signal changes
+            while runnables:
+                process = runnables.popleft()
+                process.runnable = False
+                process.run()
 
             # 2. commit: apply every queued signal change, waking up any waiting processes
-            converged = self._state.commit(changed)
+            converged = commit(changed)
 
         for vcd_writer in self._vcd_writers:
+            now = self._timeline.now
             for signal_state in changed:
-                vcd_writer.update(self._timeline.now,
-                    signal_state.signal, signal_state.curr)
+                vcd_writer.update(now, signal_state)
 
     def advance(self):
         self._step()
         self._timeline.advance()
-        return any(not process.passive for process in self._processes)
+        return self._state.active_count > 0
 
     @property
     def now(self):
@@ -326,7 +427,7 @@ class PySimEngine(BaseEngine):
 
     @contextmanager
     def write_vcd(self, *, vcd_file, gtkw_file, traces):
-        vcd_writer = _VCDWriter(self._fragment,
+        vcd_writer = _VCDWriter(self._state, self._fragment,
             vcd_file=vcd_file, gtkw_file=gtkw_file, traces=traces)
         try:
             self._vcd_writers.append(vcd_writer)